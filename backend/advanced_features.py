@@ -7,45 +7,219 @@ import logging
 import time
 from collections import defaultdict, deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple, Any
 import aiohttp
+from cachetools import TTLCache
+import lxml.etree
+import lxml.html
+from lxml.cssselect import CSSSelector
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from batch_writer import BatchWriter
 import os
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# AIMD tuning for AdvancedRateLimiter: additive increase per healthy window,
+# multiplicative decrease on latency breach or 429, target mean latency (s)
+AIMD_ALPHA = 0.5
+AIMD_BETA = 0.5
+AIMD_TARGET_LATENCY = 2.0
+MIN_REQUESTS_PER_MINUTE = 3
+MAX_REQUESTS_PER_MINUTE = 60
+# Per-provider request history is a ring buffer comfortably above the max rate
+REQUEST_HISTORY_SIZE = 128
+# Number of most recent requests the adaptive limits are computed over
+ROLLING_WINDOW_SIZE = 10
+# In-memory tail of automation failures kept per provider; Mongo holds the full record
+FAILURE_PATTERN_HISTORY_SIZE = 1000
+
+# Cooldown applied per provider error type, in seconds (default 60)
+ERROR_COOLDOWNS: Mapping[str, int] = MappingProxyType({
+    "rate_limit": 300,      # 5 minute cooldown
+    "server_error": 60,     # 1 minute cooldown
+    "timeout": 30,          # 30 second cooldown
+    "maintenance": 900,     # 15 minute cooldown
+    "quota_exceeded": 3600  # 1 hour cooldown
+})
+
+# Provider response headers reporting the remaining request budget
+RATE_LIMIT_REMAINING_HEADERS = (
+    "anthropic-ratelimit-requests-remaining",
+    "x-ratelimit-remaining-requests",
+)
+RATE_LIMIT_LIMIT_HEADERS = (
+    "anthropic-ratelimit-requests-limit",
+    "x-ratelimit-limit-requests",
+)
+
+# Candidate selectors tried by auto-detection and error recovery, in order
+COMMON_SELECTOR_PATTERNS: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+    "prompt_input": (
+        "textarea[placeholder*='prompt']",
+        "input[placeholder*='prompt']",
+        "div[contenteditable='true']",
+        "div[data-slate-editor='true']"
+    ),
+    "generate_button": (
+        "button:contains('Generate')",
+        "button:contains('Create')",
+        "button:contains('Submit')",
+        "button[type='submit']"
+    ),
+    "result_images": (
+        "img[src*='generated']",
+        "img[src*='result']",
+        ".result img",
+        ".generated-image img"
+    )
+})
+
+ALTERNATIVE_SELECTORS: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+    "prompt_input": (
+        "textarea[name*='prompt']",
+        "input[name*='prompt']", 
+        "#prompt",
+        ".prompt-input",
+        "[data-testid*='prompt']"
+    ),
+    "generate_button": (
+        "button[data-testid*='generate']",
+        "button[aria-label*='generate']",
+        ".generate-btn",
+        "#generate",
+        "input[type='submit'][value*='generate']"
+    )
+})
+
+def _compile_selectors(patterns: Mapping[str, Tuple[str, ...]]) -> Mapping[str, Tuple[CSSSelector, ...]]:
+    """Compile candidate CSS selectors to XPath once, at import time"""
+    return MappingProxyType({
+        element: tuple(CSSSelector(selector) for selector in selectors)
+        for element, selectors in patterns.items()
+    })
+
+_COMPILED_COMMON_PATTERNS = _compile_selectors(COMMON_SELECTOR_PATTERNS)
+_COMPILED_ALTERNATIVE_SELECTORS = _compile_selectors(ALTERNATIVE_SELECTORS)
+
+def _parse_page(page_source: str):
+    """Parse page HTML once for selector matching, or None if there is nothing to parse"""
+    if not page_source or not page_source.strip():
+        return None
+    try:
+        return lxml.html.fromstring(page_source)
+    except (ValueError, lxml.etree.ParserError):
+        return None
+
+def _first_matching_selector(root, selectors: Tuple[CSSSelector, ...]) -> Optional[str]:
+    """Return the first candidate selector that matches an element on the page"""
+    for selector in selectors:
+        if selector(root):
+            return selector.css
+    return None
+
+# Indexes backing the scheduler and analytics queries, created once at startup
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> bool:
+    """Create the compound indexes used by the advanced features; call once at startup"""
+    try:
+        await asyncio.gather(
+            db.jobs.create_index([("provider", 1), ("status", 1), ("created_at", -1)], background=True),
+            db.jobs.create_index([("status", 1), ("completed_at", -1)], background=True),
+            db.jobs.create_index([("created_at", -1)], background=True),
+            db.selector_updates.create_index([("provider", 1), ("timestamp", -1)], background=True),
+            db.manual_queue.create_index([("provider", 1), ("queued_at", -1)], background=True)
+        )
+    except Exception as e:
+        logger.error(f"Error ensuring advanced feature indexes: {str(e)}")
+        return False
+    
+    logger.info("Ensured advanced feature indexes")
+    return True
+
+def _parse_header_number(value: Optional[str]) -> Optional[float]:
+    """Parse a numeric header value, ignoring HTTP-date and malformed values"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _first_header_number(headers: Dict[str, str], names: tuple) -> Optional[float]:
+    """Return the first numeric value found among the given header names"""
+    for name in names:
+        value = _parse_header_number(headers.get(name))
+        if value is not None:
+            return value
+    return None
+
+class BulkInsertWriter(BatchWriter):
+    """
+    Buffers fire-and-forget inserts and writes them with insert_many,
+    flushing every `max_batch` documents or `max_delay` seconds
+    """
+    
+    def __init__(self, db: AsyncIOMotorDatabase, max_batch: int = 100, max_delay: float = 0.1):
+        super().__init__(self._insert_batch, max_batch, max_delay)
+        self.db = db
+    
+    def enqueue(self, collection: str, document: Dict[str, Any]):
+        """Queue a document for insertion, starting the drain loop on first use"""
+        super().enqueue((collection, document))
+    
+    async def _insert_batch(self, batch: List[tuple]):
+        by_collection = defaultdict(list)
+        for collection, document in batch:
+            by_collection[collection].append(document)
+        
+        for collection, documents in by_collection.items():
+            try:
+                await self.db[collection].insert_many(documents, ordered=False)
+            except Exception as e:
+                logger.error(f"Error writing {len(documents)} documents to {collection}: {str(e)}")
+
 class DynamicSelectorManager:
     """
     Advanced selector management system that allows dynamic updates
     without code changes - addressing the maintenance issue from the analysis
     """
     
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncIOMotorDatabase, writer: Optional[BulkInsertWriter] = None):
         self.db = db
-        self.selector_cache = {}
-        self.last_updated = {}
+        self._owns_writer = writer is None
+        self.writer = writer or BulkInsertWriter(db)
+        self.selector_cache = TTLCache(maxsize=256, ttl=300)  # 5 minute cache
+        self._selector_locks = defaultdict(asyncio.Lock)  # provider -> refill lock
+    
+    async def close(self):
+        """Flush buffered audit writes; call from the owner's shutdown hook"""
+        if self._owns_writer:
+            await self.writer.close()
         
     async def get_selectors(self, provider: str) -> Dict[str, str]:
         """Get current selectors for a provider with caching"""
-        now = time.time()
-        
-        # Check cache validity (5 minute cache)
-        if (provider in self.selector_cache and 
-            provider in self.last_updated and 
-            now - self.last_updated[provider] < 300):
+        try:
             return self.selector_cache[provider]
+        except KeyError:
+            pass
         
-        # Fetch from database
-        provider_doc = await self.db.providers.find_one({"name": provider})
-        if not provider_doc:
-            return {}
+        # Only one coroutine refills a given provider; the rest reuse its result
+        async with self._selector_locks[provider]:
+            try:
+                return self.selector_cache[provider]
+            except KeyError:
+                pass
             
-        selectors = provider_doc.get("selectors", {})
-        
-        # Update cache
-        self.selector_cache[provider] = selectors
-        self.last_updated[provider] = now
+            # Fetch from database
+            provider_doc = await self.db.providers.find_one({"name": provider}, {"selectors": 1, "_id": 0})
+            if not provider_doc:
+                return {}
+                
+            selectors = provider_doc.get("selectors", {})
+            
+            # Update cache
+            self.selector_cache[provider] = selectors
         
         logger.info(f"Updated selectors for {provider}: {list(selectors.keys())}")
         return selectors
@@ -67,13 +241,10 @@ class DynamicSelectorManager:
             
             if result.modified_count > 0:
                 # Clear cache to force refresh
-                if provider in self.selector_cache:
-                    del self.selector_cache[provider]
-                if provider in self.last_updated:
-                    del self.last_updated[provider]
+                self.selector_cache.pop(provider, None)
                 
                 # Log update
-                await self.db.selector_updates.insert_one({
+                self.writer.enqueue("selector_updates", {
                     "provider": provider,
                     "selectors": new_selectors,
                     "reason": reason,
@@ -95,34 +266,17 @@ class DynamicSelectorManager:
         AI-powered selector detection (placeholder for future ML implementation)
         This would use machine learning to automatically detect UI changes
         """
-        # For now, return common patterns
-        common_patterns = {
-            "prompt_input": [
-                "textarea[placeholder*='prompt']",
-                "input[placeholder*='prompt']",
-                "div[contenteditable='true']",
-                "div[data-slate-editor='true']"
-            ],
-            "generate_button": [
-                "button:contains('Generate')",
-                "button:contains('Create')",
-                "button:contains('Submit')",
-                "button[type='submit']"
-            ],
-            "result_images": [
-                "img[src*='generated']",
-                "img[src*='result']",
-                ".result img",
-                ".generated-image img"
-            ]
-        }
+        # For now, pick the first common pattern present on the page, falling
+        # back to the most likely pattern when it cannot be checked
+        root = _parse_page(page_source)
+        
+        detected = {}
+        for element, selectors in _COMPILED_COMMON_PATTERNS.items():
+            match = _first_matching_selector(root, selectors) if root is not None else None
+            detected[element] = match or COMMON_SELECTOR_PATTERNS[element][0]
         
         # This would be enhanced with actual AI detection logic
-        return {
-            "prompt_input": common_patterns["prompt_input"][0],
-            "generate_button": common_patterns["generate_button"][0], 
-            "result_images": common_patterns["result_images"][0]
-        }
+        return detected
 
 class AdvancedRateLimiter:
     """
@@ -130,93 +284,162 @@ class AdvancedRateLimiter:
     """
     
     def __init__(self):
-        self.request_history = defaultdict(deque)  # provider -> [(timestamp, success)]
-        self.adaptive_limits = defaultdict(lambda: {"requests_per_minute": 10, "burst_allowed": 3})
+        self.request_history = defaultdict(lambda: deque(maxlen=REQUEST_HISTORY_SIZE))  # provider -> [(timestamp, success)]
+        self.adaptive_limits = defaultdict(lambda: {"requests_per_minute": 10, "burst_allowed": 3, "concurrency": 10.0})
         self.cooldown_periods = defaultdict(float)  # provider -> cooldown_end_time
+        # Running totals over the last ROLLING_WINDOW_SIZE requests per provider
+        self._rolling = defaultdict(lambda: {
+            "ok": 0, "rt_sum": 0.0, "rt_n": 0,
+            "window": deque(maxlen=ROLLING_WINDOW_SIZE),
+            "since_decrease": ROLLING_WINDOW_SIZE,
+            "since_increase": ROLLING_WINDOW_SIZE
+        })
+        # Monotonic so wall-clock steps (NTP) cannot shorten or extend cooldowns
+        self._clock = time.monotonic
         
-    async def can_make_request(self, provider: str) -> tuple[bool, float]:
+    def can_make_request(self, provider: str) -> tuple[bool, float]:
         """
         Check if request can be made, return (allowed, wait_seconds)
         """
-        now = time.time()
+        now = self._clock()
         
         # Check if in cooldown period
         if provider in self.cooldown_periods and now < self.cooldown_periods[provider]:
             wait_time = self.cooldown_periods[provider] - now
             return False, wait_time
         
-        # Clean old entries (older than 1 minute)
+        # Count entries from the last minute; history is time-ordered and
+        # bounded, so stale entries are evicted on append instead of swept here
         minute_ago = now - 60
-        history = self.request_history[provider]
-        while history and history[0][0] < minute_ago:
-            history.popleft()
+        current_requests = 0
+        oldest_in_window = now
+        for timestamp, _, _, _ in reversed(self.request_history[provider]):
+            if timestamp < minute_ago:
+                break
+            current_requests += 1
+            oldest_in_window = timestamp
         
         # Get current limits
         limits = self.adaptive_limits[provider]
-        current_requests = len(history)
         
         # Check if under limit
         if current_requests < limits["requests_per_minute"]:
             return True, 0
         
-        # Calculate wait time until oldest request expires
-        if history:
-            wait_time = 60 - (now - history[0][0])
-            return False, max(0, wait_time)
-        
-        return True, 0
+        # Calculate wait time until oldest request in the window expires
+        wait_time = 60 - (now - oldest_in_window)
+        return False, max(0, wait_time)
     
     async def record_request(self, provider: str, success: bool, 
-                           response_time: float = 0, error_type: str = None):
+                           response_time: float = 0, error_type: str = None,
+                           headers: Optional[Dict[str, str]] = None):
         """Record request result and adapt limits"""
-        now = time.time()
+        now = self._clock()
         self.request_history[provider].append((now, success, response_time, error_type))
+        self._update_rolling(provider, success, response_time)
+        
+        # Honour provider-reported budget before it turns into a 429
+        header_cooldown = self._apply_header_backpressure(provider, headers)
         
         # Analyze recent performance and adapt
-        await self._adapt_limits(provider)
+        self._adapt_limits(provider, success, error_type)
         
-        # Handle specific error types
-        if not success and error_type:
-            await self._handle_error(provider, error_type)
+        # Handle specific error types; an explicit retry-after supersedes the
+        # fixed cooldown table
+        if not success and error_type and not header_cooldown:
+            self._handle_error(provider, error_type)
     
-    async def _adapt_limits(self, provider: str):
-        """Intelligently adapt rate limits based on performance"""
-        history = self.request_history[provider]
-        if len(history) < 5:  # Need minimum data
+    def _update_rolling(self, provider: str, success: bool, response_time: float):
+        """Slide the rolling window by one request, adjusting totals in O(1)"""
+        rolling = self._rolling[provider]
+        window = rolling["window"]
+        
+        if len(window) == window.maxlen:
+            displaced_success, displaced_rt = window[0]
+            rolling["ok"] -= displaced_success
+            if displaced_rt > 0:
+                rolling["rt_sum"] -= displaced_rt
+                rolling["rt_n"] -= 1
+        
+        window.append((success, response_time))
+        rolling["since_decrease"] += 1
+        rolling["since_increase"] += 1
+        rolling["ok"] += success
+        if response_time > 0:
+            rolling["rt_sum"] += response_time
+            rolling["rt_n"] += 1
+    
+    def _apply_header_backpressure(self, provider: str, headers: Optional[Dict[str, str]]) -> bool:
+        """Apply a retry-after cooldown when the provider reports a nearly exhausted budget"""
+        if not headers:
+            return False
+        
+        headers = {key.lower(): value for key, value in headers.items()}
+        retry_after = _parse_header_number(headers.get("retry-after"))
+        if retry_after is None:
+            return False
+        
+        remaining = _first_header_number(headers, RATE_LIMIT_REMAINING_HEADERS)
+        limit = _first_header_number(headers, RATE_LIMIT_LIMIT_HEADERS) or 0
+        
+        # A bare retry-after (429/503) is always honoured; otherwise only once
+        # the remaining budget drops to the low-water mark
+        if remaining is not None and remaining > max(2, 0.1 * limit):
+            return False
+        
+        self._extend_cooldown(provider, retry_after)
+        logger.warning(f"Applied {retry_after:.0f}s header cooldown to {provider} (remaining: {remaining})")
+        return True
+    
+    def _adapt_limits(self, provider: str, success: bool = True, error_type: str = None):
+        """Adapt rate limits with AIMD on recent latency and success rate"""
+        rolling = self._rolling[provider]
+        window_size = len(rolling["window"])
+        if window_size < 5 and error_type != "rate_limit":  # Need minimum data
             return
         
-        recent_requests = list(history)[-10:]  # Last 10 requests
-        success_rate = sum(1 for _, success, _, _ in recent_requests if success) / len(recent_requests)
-        avg_response_time = sum(rt for _, _, rt, _ in recent_requests if rt > 0) / len([rt for _, _, rt, _ in recent_requests if rt > 0]) if any(rt for _, _, rt, _ in recent_requests) else 0
+        success_rate = rolling["ok"] / window_size
+        avg_response_time = rolling["rt_sum"] / rolling["rt_n"] if rolling["rt_n"] else 0
         
-        current_limit = self.adaptive_limits[provider]["requests_per_minute"]
+        limits = self.adaptive_limits[provider]
+        current_limit = limits["requests_per_minute"]
+        
+        # Multiplicative decrease on breach, additive increase on a healthy
+        # window. Each moves at most once per window, so one burst of errors
+        # is not punished repeatedly and the limit climbs per window of
+        # evidence rather than per request; an increase also needs the
+        # current request to have succeeded
+        if error_type == "rate_limit" or avg_response_time > AIMD_TARGET_LATENCY or success_rate < 0.8:
+            if rolling["since_decrease"] < ROLLING_WINDOW_SIZE:
+                return
+            rolling["since_decrease"] = 0
+            concurrency = max(limits["concurrency"] * AIMD_BETA, float(MIN_REQUESTS_PER_MINUTE))
+        else:
+            if (not success or rolling["since_increase"] < ROLLING_WINDOW_SIZE
+                    or rolling["since_decrease"] < ROLLING_WINDOW_SIZE):
+                return
+            rolling["since_increase"] = 0
+            concurrency = min(limits["concurrency"] + AIMD_ALPHA, float(MAX_REQUESTS_PER_MINUTE))
+        
+        limits["concurrency"] = concurrency
+        new_limit = int(concurrency)
+        if new_limit == current_limit:
+            return
         
-        # Increase limit if performing well
-        if success_rate > 0.95 and avg_response_time < 2.0 and current_limit < 60:
-            new_limit = min(current_limit + 2, 60)
-            self.adaptive_limits[provider]["requests_per_minute"] = new_limit
+        limits["requests_per_minute"] = new_limit
+        if new_limit > current_limit:
             logger.info(f"Increased rate limit for {provider} to {new_limit} req/min (success: {success_rate:.2%})")
-        
-        # Decrease limit if having issues
-        elif success_rate < 0.8 or avg_response_time > 10.0:
-            new_limit = max(current_limit - 2, 3)
-            self.adaptive_limits[provider]["requests_per_minute"] = new_limit
+        else:
             logger.warning(f"Decreased rate limit for {provider} to {new_limit} req/min (success: {success_rate:.2%}, avg_time: {avg_response_time:.1f}s)")
     
-    async def _handle_error(self, provider: str, error_type: str):
+    def _extend_cooldown(self, provider: str, seconds: float):
+        """Extend a provider cooldown, never shortening one already in effect"""
+        self.cooldown_periods[provider] = max(self.cooldown_periods.get(provider, 0.0), self._clock() + seconds)
+    
+    def _handle_error(self, provider: str, error_type: str):
         """Handle specific error types with appropriate responses"""
-        now = time.time()
-        
-        error_responses = {
-            "rate_limit": 300,      # 5 minute cooldown
-            "server_error": 60,     # 1 minute cooldown  
-            "timeout": 30,          # 30 second cooldown
-            "maintenance": 900,     # 15 minute cooldown
-            "quota_exceeded": 3600  # 1 hour cooldown
-        }
-        
-        cooldown_seconds = error_responses.get(error_type, 60)
-        self.cooldown_periods[provider] = now + cooldown_seconds
+        cooldown_seconds = ERROR_COOLDOWNS.get(error_type, 60)
+        self._extend_cooldown(provider, cooldown_seconds)
         
         logger.warning(f"Applied {cooldown_seconds}s cooldown to {provider} due to {error_type}")
 
@@ -225,10 +448,12 @@ class EnhancedErrorRecovery:
     Advanced error recovery system with multiple fallback strategies
     """
     
-    def __init__(self, db: AsyncIOMotorDatabase, selector_manager: DynamicSelectorManager):
+    def __init__(self, db: AsyncIOMotorDatabase, selector_manager: DynamicSelectorManager,
+                 writer: Optional[BulkInsertWriter] = None):
         self.db = db
         self.selector_manager = selector_manager
-        self.failure_patterns = defaultdict(list)  # provider -> [failure_info]
+        self.writer = writer or selector_manager.writer
+        self.failure_patterns = defaultdict(lambda: deque(maxlen=FAILURE_PATTERN_HISTORY_SIZE))  # provider -> [failure_info]
         
     async def handle_automation_failure(self, provider: str, job_id: str, 
                                       error_type: str, error_details: Dict[str, Any]) -> bool:
@@ -245,6 +470,7 @@ class EnhancedErrorRecovery:
             "details": error_details
         }
         self.failure_patterns[provider].append(failure_info)
+        self.writer.enqueue("failure_patterns", {"provider": provider, **failure_info})
         
         # Try recovery strategies in order
         recovery_strategies = [
@@ -330,27 +556,18 @@ class EnhancedErrorRecovery:
                                         page_source: str) -> Dict[str, str]:
         """Find alternative selectors for missing elements"""
         # This would include intelligent selector discovery
-        # For now, return common alternatives
-        
-        alternatives = {
-            "prompt_input": [
-                "textarea[name*='prompt']",
-                "input[name*='prompt']", 
-                "#prompt",
-                ".prompt-input",
-                "[data-testid*='prompt']"
-            ],
-            "generate_button": [
-                "button[data-testid*='generate']",
-                "button[aria-label*='generate']",
-                ".generate-btn",
-                "#generate",
-                "input[type='submit'][value*='generate']"
-            ]
-        }
+        # For now, return the first common alternative present on the page
+        if missing_element not in ALTERNATIVE_SELECTORS:
+            return {}
         
-        if missing_element in alternatives:
-            return {missing_element: alternatives[missing_element][0]}
+        root = _parse_page(page_source)
+        if root is None:
+            # Nothing to check against, assume the most likely alternative
+            return {missing_element: ALTERNATIVE_SELECTORS[missing_element][0]}
+        
+        match = _first_matching_selector(root, _COMPILED_ALTERNATIVE_SELECTORS[missing_element])
+        if match:
+            return {missing_element: match}
         
         return {}
 
@@ -389,46 +606,57 @@ class SmartJobScheduler:
     
     async def _calculate_optimal_delay(self, provider: str) -> float:
         """Calculate optimal delay based on provider performance patterns"""
-        # Analyze recent job completion times for the provider
-        recent_jobs = await self.db.jobs.find({
-            "provider": provider,
-            "status": "completed",
-            "completed_at": {"$gte": datetime.utcnow() - timedelta(hours=24)}
-        }).sort("completed_at", -1).limit(50).to_list(50)
-        
-        if not recent_jobs:
-            return 0  # No delay if no historical data
+        # Average processing time of the last 50 completions, computed server-side
+        pipeline = [
+            {"$match": {
+                "provider": provider,
+                "status": "completed",
+                "completed_at": {"$gte": datetime.utcnow() - timedelta(hours=24)}
+            }},
+            {"$sort": {"completed_at": -1}},
+            {"$limit": 50},
+            {
+                "$group": {
+                    "_id": None,
+                    "avg_processing_time": {
+                        "$avg": {"$subtract": ["$completed_at", "$created_at"]}
+                    }
+                }
+            }
+        ]
         
-        # Calculate average processing time
-        processing_times = []
-        for job in recent_jobs:
-            if job.get("completed_at") and job.get("created_at"):
-                processing_time = (job["completed_at"] - job["created_at"]).total_seconds()
-                processing_times.append(processing_time)
+        results = await self.db.jobs.aggregate(pipeline).to_list(1)
         
-        if processing_times:
-            avg_processing_time = sum(processing_times) / len(processing_times)
-            # Add some buffer time
-            return min(avg_processing_time * 0.1, 30)  # Max 30 second delay
+        if not results or not results[0]["avg_processing_time"]:
+            return 0  # No delay if no historical data
         
-        return 0
+        avg_processing_time = results[0]["avg_processing_time"] / 1000
+        # Add some buffer time
+        return min(avg_processing_time * 0.1, 30)  # Max 30 second delay
     
     async def _adjust_priority(self, provider: str, base_priority: int) -> int:
         """Adjust job priority based on provider reliability"""
-        # Get recent success rate for provider
-        recent_jobs = await self.db.jobs.count_documents({
-            "provider": provider,
-            "created_at": {"$gte": datetime.utcnow() - timedelta(hours=6)}
-        })
+        # Get recent success rate for provider in one round-trip
+        pipeline = [
+            {"$match": {
+                "provider": provider,
+                "created_at": {"$gte": datetime.utcnow() - timedelta(hours=6)}
+            }},
+            {
+                "$group": {
+                    "_id": None,
+                    "total_jobs": {"$sum": 1},
+                    "completed_jobs": {
+                        "$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}
+                    }
+                }
+            }
+        ]
         
-        successful_jobs = await self.db.jobs.count_documents({
-            "provider": provider,
-            "status": "completed",
-            "created_at": {"$gte": datetime.utcnow() - timedelta(hours=6)}
-        })
+        results = await self.db.jobs.aggregate(pipeline).to_list(1)
         
-        if recent_jobs > 0:
-            success_rate = successful_jobs / recent_jobs
+        if results and results[0]["total_jobs"] > 0:
+            success_rate = results[0]["completed_jobs"] / results[0]["total_jobs"]
             
             # Boost priority for reliable providers
             if success_rate > 0.9:
@@ -457,11 +685,28 @@ class AdvancedAnalytics:
         
         start_time = datetime.utcnow() - time_delta
         
-        # Aggregate job statistics
-        job_stats = await self._get_job_statistics(start_time)
-        provider_stats = await self._get_provider_statistics(start_time)
-        error_analysis = await self._get_error_analysis(start_time)
-        performance_trends = await self._get_performance_trends(start_time)
+        # Aggregate job, provider and error statistics in a single pass over
+        # the time-filtered jobs
+        pipeline = [
+            {"$match": {"created_at": {"$gte": start_time}}},
+            {
+                "$facet": {
+                    "job_statistics": self._job_statistics_stages(),
+                    "provider_statistics": self._provider_statistics_stages(),
+                    "error_analysis": self._error_analysis_stages()
+                }
+            }
+        ]
+        
+        facet_results, performance_trends = await asyncio.gather(
+            self.db.jobs.aggregate(pipeline).to_list(1),
+            self._get_performance_trends(start_time)
+        )
+        facets = facet_results[0]
+        
+        job_stats = self._summarize_job_statistics(facets["job_statistics"])
+        provider_stats = self._summarize_provider_statistics(facets["provider_statistics"])
+        error_analysis = self._summarize_error_analysis(facets["error_analysis"])
         
         return {
             "time_range": time_range,
@@ -473,10 +718,9 @@ class AdvancedAnalytics:
             "recommendations": await self._generate_recommendations(job_stats, provider_stats, error_analysis)
         }
     
-    async def _get_job_statistics(self, start_time: datetime) -> Dict[str, Any]:
-        """Get comprehensive job statistics"""
-        pipeline = [
-            {"$match": {"created_at": {"$gte": start_time}}},
+    def _job_statistics_stages(self) -> List[Dict[str, Any]]:
+        """Facet stages for per-status job statistics"""
+        return [
             {
                 "$group": {
                     "_id": "$status",
@@ -489,12 +733,17 @@ class AdvancedAnalytics:
                 }
             }
         ]
+    
+    def _summarize_job_statistics(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Get comprehensive job statistics"""
+        status_breakdown = {}
+        total_jobs = 0
+        for result in results:
+            status_breakdown[result["_id"]] = result["count"]
+            total_jobs += result["count"]
         
-        results = await self.db.jobs.aggregate(pipeline).to_list(None)
-        
-        total_jobs = sum(result["count"] for result in results)
-        completed_jobs = next((r["count"] for r in results if r["_id"] == "completed"), 0)
-        failed_jobs = next((r["count"] for r in results if r["_id"] == "failed"), 0)
+        completed_jobs = status_breakdown.get("completed", 0)
+        failed_jobs = status_breakdown.get("failed", 0)
         
         return {
             "total_jobs": total_jobs,
@@ -502,13 +751,12 @@ class AdvancedAnalytics:
             "failed_jobs": failed_jobs,
             "success_rate": (completed_jobs / total_jobs * 100) if total_jobs > 0 else 0,
             "failure_rate": (failed_jobs / total_jobs * 100) if total_jobs > 0 else 0,
-            "status_breakdown": {result["_id"]: result["count"] for result in results}
+            "status_breakdown": status_breakdown
         }
     
-    async def _get_provider_statistics(self, start_time: datetime) -> Dict[str, Any]:
-        """Get provider-specific performance statistics"""
-        pipeline = [
-            {"$match": {"created_at": {"$gte": start_time}}},
+    def _provider_statistics_stages(self) -> List[Dict[str, Any]]:
+        """Facet stages for provider-specific performance statistics"""
+        return [
             {
                 "$group": {
                     "_id": "$provider",
@@ -519,11 +767,11 @@ class AdvancedAnalytics:
                     "failed_jobs": {
                         "$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}
                     },
-                    "avg_processing_time": {
+                    "avg_processing_time_seconds": {
                         "$avg": {
                             "$cond": [
                                 {"$eq": ["$status", "completed"]},
-                                {"$subtract": ["$completed_at", "$created_at"]},
+                                {"$divide": [{"$subtract": ["$completed_at", "$created_at"]}, 1000]},
                                 None
                             ]
                         }
@@ -531,9 +779,9 @@ class AdvancedAnalytics:
                 }
             }
         ]
-        
-        results = await self.db.jobs.aggregate(pipeline).to_list(None)
-        
+    
+    def _summarize_provider_statistics(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Get provider-specific performance statistics"""
         provider_stats = {}
         for result in results:
             provider = result["_id"]
@@ -545,16 +793,15 @@ class AdvancedAnalytics:
                 "completed_jobs": completed,
                 "failed_jobs": result["failed_jobs"],
                 "success_rate": (completed / total * 100) if total > 0 else 0,
-                "avg_processing_time_seconds": result["avg_processing_time"] / 1000 if result["avg_processing_time"] else 0
+                "avg_processing_time_seconds": result["avg_processing_time_seconds"] or 0
             }
         
         return provider_stats
     
-    async def _get_error_analysis(self, start_time: datetime) -> Dict[str, Any]:
-        """Analyze error patterns and frequencies"""
-        pipeline = [
+    def _error_analysis_stages(self) -> List[Dict[str, Any]]:
+        """Facet stages for error patterns and frequencies"""
+        return [
             {"$match": {
-                "created_at": {"$gte": start_time},
                 "status": "failed",
                 "error": {"$exists": True, "$ne": None}
             }},
@@ -565,18 +812,32 @@ class AdvancedAnalytics:
                     "providers": {"$addToSet": "$provider"}
                 }
             },
-            {"$sort": {"count": -1}}
+            {"$sort": {"count": -1}},
+            # Total across all errors, but only the top 10 leave the server
+            {
+                "$group": {
+                    "_id": None,
+                    "total_errors": {"$sum": "$count"},
+                    "error_types": {
+                        "$push": {"error": "$_id", "count": "$count", "providers": "$providers"}
+                    }
+                }
+            },
+            {"$project": {"total_errors": 1, "error_types": {"$slice": ["$error_types", 10]}}}
         ]
-        
-        results = await self.db.jobs.aggregate(pipeline).to_list(None)
+    
+    def _summarize_error_analysis(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Analyze error patterns and frequencies"""
+        if not results:
+            return {"total_errors": 0, "error_types": []}
         
         return {
-            "total_errors": sum(result["count"] for result in results),
+            "total_errors": results[0]["total_errors"],
             "error_types": [{
-                "error_message": result["_id"],
+                "error_message": result["error"],
                 "count": result["count"],
                 "affected_providers": result["providers"]
-            } for result in results[:10]]  # Top 10 errors
+            } for result in results[0]["error_types"]]  # Top 10 errors
         }
     
     async def _get_performance_trends(self, start_time: datetime) -> Dict[str, Any]:
@@ -618,6 +879,8 @@ class AdvancedAnalytics:
 
 # Export classes for use in main application
 __all__ = [
+    'ensure_indexes',
+    'BulkInsertWriter',
     'DynamicSelectorManager',
     'AdvancedRateLimiter', 
     'EnhancedErrorRecovery',
@@ -0,0 +1,71 @@
+# Batching writer shared by the server and the advanced features module
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Queued by BatchWriter.close() to tell the drain loop to finish
+_STOP_DRAIN = object()
+
+class BatchWriter:
+    """
+    Buffers fire-and-forget writes and hands them to `flush` in batches,
+    every `max_batch` items or `max_delay` seconds
+    """
+    
+    def __init__(self, flush: Callable[[List[Any]], Awaitable[None]],
+                 max_batch: int = 100, max_delay: float = 0.1):
+        self.flush = flush
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._drain_task: Optional[asyncio.Task] = None
+    
+    def enqueue(self, item: Any):
+        """Queue an item for writing, starting the drain loop on first use"""
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = asyncio.create_task(self._drain_loop())
+        self._queue.put_nowait(item)
+    
+    async def close(self):
+        """Flush everything queued so far and stop the drain loop"""
+        if self._drain_task is None:
+            return
+        
+        # The sentinel is queued behind every pending item, so the drain loop
+        # writes its in-flight batch and the backlog before exiting
+        self._queue.put_nowait(_STOP_DRAIN)
+        await self._drain_task
+        self._drain_task = None
+    
+    async def _drain_loop(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP_DRAIN:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP_DRAIN:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            try:
+                await self.flush(batch)
+            except Exception as e:
+                logger.error(f"Error flushing {len(batch)} buffered writes: {str(e)}")
+
+__all__ = ['BatchWriter']
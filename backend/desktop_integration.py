@@ -6,31 +6,202 @@ import sys
 import json
 import logging
 import asyncio
+import shutil
 import subprocess
+import tempfile
+import time
+import zipfile
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Tuple, Any
 import platform
-import psutil
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache, partial
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# Shortest interval psutil needs for a meaningful non-blocking CPU sample
+_MIN_CPU_SAMPLE_INTERVAL = 0.1
+
+# /proc/meminfo fields needed to derive the memory summary (values in kB)
+_MEMINFO_FIELDS = (b"MemTotal", b"MemFree", b"MemAvailable")
+
+def _read_proc_meminfo() -> Dict[str, int]:
+    """Read the needed /proc/meminfo fields in bytes, in a single read"""
+    with open("/proc/meminfo", "rb") as f:
+        data = f.read()
+    
+    fields = {}
+    for line in data.splitlines():
+        name, _, value = line.partition(b":")
+        if name in _MEMINFO_FIELDS:
+            fields[name.decode()] = int(value.split()[0]) * 1024
+    return fields
+
+# Auto-start and shortcut file templates, filled in with the executable path
+_MACOS_LAUNCH_AGENT_PLIST = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
+<plist version="1.0">
+<dict>
+    <key>Label</key>
+    <string>com.aimanager.desktop</string>
+    <key>ProgramArguments</key>
+    <array>
+        <string>{exe}</string>
+    </array>
+    <key>RunAtLoad</key>
+    <true/>
+    <key>KeepAlive</key>
+    <false/>
+</dict>
+</plist>"""
+
+_LINUX_AUTOSTART_ENTRY = """[Desktop Entry]
+Type=Application
+Name=AI Image Generator Manager
+Comment=Advanced desktop application for AI image generation
+Exec={exe}
+Icon=ai-image-generator-manager
+Hidden=false
+NoDisplay=false
+X-GNOME-Autostart-enabled=true
+"""
+
+_LINUX_SHORTCUT_ENTRY = """[Desktop Entry]
+Version=1.0
+Type=Application
+Name=AI Image Generator Manager
+Comment=Advanced desktop application for AI image generation
+Exec={exe}
+Icon=ai-image-generator-manager
+Terminal=false
+Categories=Graphics;Photography;
+"""
+
+@lru_cache(maxsize=1)
+def _psutil():
+    """Import psutil on first use; it loads its C extension and probes the kernel"""
+    import psutil
+    return psutil
+
+@lru_cache(maxsize=None)
+def _render_template(template: str) -> bytes:
+    """Fill a template with the executable path and encode it, once per template"""
+    return template.format(exe=sys.executable).encode('utf-8')
+
+def _write_file_bytes(path: Path, data: bytes, mode: int):
+    """Write bytes with raw os calls, bypassing the buffered text I/O stack"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        # Apply the mode even when the file existed or umask masked it
+        os.fchmod(fd, mode)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+def _dump_json(data: Dict[str, Any]) -> bytes:
+    """Serialize to indented JSON bytes, with orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode('utf-8')
+
+def _load_json(data: bytes) -> Dict[str, Any]:
+    """Parse JSON bytes, with orjson when available"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _zip_info(arcname: str, stat_result: os.stat_result) -> zipfile.ZipInfo:
+    """Build a deflated ZipInfo from an existing stat result"""
+    # Zip timestamps cannot predate 1980
+    date_time = max(time.localtime(stat_result.st_mtime)[:6], (1980, 1, 1, 0, 0, 0))
+    info = zipfile.ZipInfo(arcname, date_time=date_time)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = (stat_result.st_mode & 0xFFFF) << 16
+    info.file_size = stat_result.st_size
+    return info
+
+def _tail_lines(path: Path, lines: int, block_size: int = 8192) -> List[str]:
+    """Return the last `lines` lines of a file, reading backwards in blocks like `tail -n`"""
+    if lines <= 0:
+        return []
+    
+    with open(path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        blocks = []
+        newlines = 0
+        # One extra line break guarantees the first kept line is complete
+        while pos > 0 and newlines <= lines:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step)
+            # Count \n, \r\n and bare \r as one break each, including a \r\n
+            # split across this block and the one read before it
+            newlines += block.count(b"\n") + block.count(b"\r") - block.count(b"\r\n")
+            if blocks and block.endswith(b"\r") and blocks[-1].startswith(b"\n"):
+                newlines -= 1
+            blocks.append(block)
+    
+    data = b"".join(reversed(blocks)).replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    return [line.decode('utf-8', errors='replace') for line in data.splitlines(keepends=True)[-lines:]]
+
 class DesktopIntegration:
     """
     Desktop integration features for the AI Image Generator Manager
     """
     
+    __slots__ = (
+        "platform", "app_data_dir", "config_file", "logs_dir", "cache_dir",
+        "_platform_info", "_cpu_primed_at", "_log_cache",
+        "_setup_auto_start_impl", "_create_shortcut_impl"
+    )
+    
     def __init__(self):
-        self.platform = platform.system().lower()
+        # Platform details never change during the process lifetime
+        self._platform_info = {
+            "system": platform.system(),
+            "release": platform.release(),
+            "version": platform.version(),
+            "machine": platform.machine(),
+            "processor": platform.processor()
+        }
+        self.platform = self._platform_info["system"].lower()
         self.app_data_dir = self._get_app_data_directory()
         self.config_file = self.app_data_dir / "config.json"
         self.logs_dir = self.app_data_dir / "logs"
         self.cache_dir = self.app_data_dir / "cache"
+        # (logs dir mtime_ns, newest log) so get_app_logs rescans only on change
+        self._log_cache: Optional[Tuple[int, Optional[Path]]] = None
+        
+        # Bind the platform-specific implementations once
+        dispatch = {
+            "windows": (self._setup_windows_auto_start, self._create_windows_shortcut),
+            "darwin": (self._setup_macos_auto_start, self._create_macos_shortcut)
+        }
+        self._setup_auto_start_impl, self._create_shortcut_impl = dispatch.get(
+            self.platform, (self._setup_linux_auto_start, self._create_linux_shortcut)
+        )
         
-        # Ensure directories exist
-        self.app_data_dir.mkdir(parents=True, exist_ok=True)
-        self.logs_dir.mkdir(parents=True, exist_ok=True)
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Prime psutil's CPU counters so later samples are non-blocking deltas
+        _psutil().cpu_percent(interval=None)
+        self._cpu_primed_at = time.monotonic()
+        
+        # Directories are created lazily by the operations that write to them
+    
+    @staticmethod
+    def _ensure_dir(path: Path):
+        """Create a directory on first use, with a single stat when it already exists"""
+        try:
+            os.stat(path)
+        except FileNotFoundError:
+            path.mkdir(parents=True, exist_ok=True)
     
     def _get_app_data_directory(self) -> Path:
         """Get the appropriate application data directory for the platform"""
@@ -46,24 +217,33 @@ class DesktopIntegration:
     async def get_system_info(self) -> Dict[str, Any]:
         """Get comprehensive system information"""
         try:
-            # CPU information
+            psutil = _psutil()
+            
+            # Run the kernel probes concurrently off the event loop
+            cpu_freq, memory_info, disk, network = await asyncio.gather(
+                asyncio.to_thread(psutil.cpu_freq),
+                asyncio.to_thread(self._get_memory_info),
+                asyncio.to_thread(psutil.disk_usage, '/'),
+                asyncio.to_thread(psutil.net_io_counters)
+            )
+            
+            # CPU information, as usage since the previous sample rather than
+            # blocking the event loop for a one second interval. Right after
+            # priming there is no meaningful interval yet, so report None
+            # instead of a misleading 0.0
+            cpu_usage = psutil.cpu_percent(interval=None)
+            if self._cpu_primed_at is not None:
+                if time.monotonic() - self._cpu_primed_at < _MIN_CPU_SAMPLE_INTERVAL:
+                    cpu_usage = None
+                else:
+                    self._cpu_primed_at = None
             cpu_info = {
                 "count": psutil.cpu_count(),
-                "usage": psutil.cpu_percent(interval=1),
-                "frequency": psutil.cpu_freq()._asdict() if psutil.cpu_freq() else None
-            }
-            
-            # Memory information
-            memory = psutil.virtual_memory()
-            memory_info = {
-                "total": memory.total,
-                "available": memory.available,
-                "used": memory.used,
-                "percentage": memory.percent
+                "usage": cpu_usage,
+                "frequency": cpu_freq._asdict() if cpu_freq else None
             }
             
             # Disk information
-            disk = psutil.disk_usage('/')
             disk_info = {
                 "total": disk.total,
                 "used": disk.used,
@@ -72,7 +252,6 @@ class DesktopIntegration:
             }
             
             # Network information
-            network = psutil.net_io_counters()
             network_info = {
                 "bytes_sent": network.bytes_sent,
                 "bytes_recv": network.bytes_recv,
@@ -81,13 +260,7 @@ class DesktopIntegration:
             }
             
             return {
-                "platform": {
-                    "system": platform.system(),
-                    "release": platform.release(),
-                    "version": platform.version(),
-                    "machine": platform.machine(),
-                    "processor": platform.processor()
-                },
+                "platform": dict(self._platform_info),
                 "cpu": cpu_info,
                 "memory": memory_info,
                 "disk": disk_info,
@@ -99,21 +272,56 @@ class DesktopIntegration:
             logger.error(f"Error getting system info: {str(e)}")
             return {"error": str(e)}
     
+    def _get_memory_info(self) -> Dict[str, Any]:
+        """Get memory usage, read straight from /proc/meminfo on Linux"""
+        if self.platform == "linux":
+            try:
+                meminfo = _read_proc_meminfo()
+                total = meminfo["MemTotal"]
+                available = meminfo.get("MemAvailable", meminfo["MemFree"])
+                used = total - available
+                return {
+                    "total": total,
+                    "available": available,
+                    "used": used,
+                    "percentage": round(used / total * 100, 1)
+                }
+            except (OSError, KeyError, ValueError, ZeroDivisionError) as e:
+                logger.debug(f"Falling back to psutil for memory info: {str(e)}")
+        
+        memory = _psutil().virtual_memory()
+        return {
+            "total": memory.total,
+            "available": memory.available,
+            "used": memory.used,
+            "percentage": memory.percent
+        }
+    
     def _get_system_uptime(self) -> float:
         """Get system uptime in seconds"""
         try:
-            return time.time() - psutil.boot_time()
+            return time.time() - _psutil().boot_time()
         except:
             return 0.0
     
     async def save_desktop_config(self, config: Dict[str, Any]) -> bool:
         """Save desktop-specific configuration"""
         try:
-            config["last_updated"] = datetime.utcnow().isoformat()
+            config["last_updated"] = datetime.now(timezone.utc).isoformat(timespec='seconds')
             config["platform"] = self.platform
             
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f, indent=2)
+            self._ensure_dir(self.app_data_dir)
+            # Write to a uniquely named sibling temp file and rename over the
+            # config so readers never observe a partially written file and
+            # concurrent saves cannot clobber each other's temp file
+            fd, tmp_name = tempfile.mkstemp(dir=self.app_data_dir, prefix='.desktop_config.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(_dump_json(config))
+                os.replace(tmp_name, self.config_file)
+            except BaseException:
+                os.unlink(tmp_name)
+                raise
             
             logger.info(f"Desktop config saved to {self.config_file}")
             return True
@@ -124,12 +332,9 @@ class DesktopIntegration:
     async def load_desktop_config(self) -> Dict[str, Any]:
         """Load desktop-specific configuration"""
         try:
-            if self.config_file.exists():
-                with open(self.config_file, 'r') as f:
-                    config = json.load(f)
-                logger.info(f"Desktop config loaded from {self.config_file}")
-                return config
-            else:
+            try:
+                config = _load_json(self.config_file.read_bytes())
+            except FileNotFoundError:
                 # Return default config
                 default_config = {
                     "window_size": {"width": 1400, "height": 900},
@@ -143,6 +348,9 @@ class DesktopIntegration:
                 }
                 await self.save_desktop_config(default_config)
                 return default_config
+            
+            logger.info(f"Desktop config loaded from {self.config_file}")
+            return config
         except Exception as e:
             logger.error(f"Error loading desktop config: {str(e)}")
             return {}
@@ -150,12 +358,7 @@ class DesktopIntegration:
     async def setup_auto_start(self, enable: bool = True) -> bool:
         """Setup application to start automatically with the system"""
         try:
-            if self.platform == "windows":
-                return await self._setup_windows_auto_start(enable)
-            elif self.platform == "darwin":
-                return await self._setup_macos_auto_start(enable)
-            else:
-                return await self._setup_linux_auto_start(enable)
+            return await self._setup_auto_start_impl(enable)
         except Exception as e:
             logger.error(f"Error setting up auto start: {str(e)}")
             return False
@@ -194,33 +397,32 @@ class DesktopIntegration:
             plist_file = launch_agents_dir / "com.aimanager.desktop.plist"
             
             if enable:
-                plist_content = f"""<?xml version="1.0" encoding="UTF-8"?>
-<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
-<plist version="1.0">
-<dict>
-    <key>Label</key>
-    <string>com.aimanager.desktop</string>
-    <key>ProgramArguments</key>
-    <array>
-        <string>{sys.executable}</string>
-    </array>
-    <key>RunAtLoad</key>
-    <true/>
-    <key>KeepAlive</key>
-    <false/>
-</dict>
-</plist>"""
+                plist_content = _render_template(_MACOS_LAUNCH_AGENT_PLIST)
+                loaded = await self._run_launchctl("list", "com.aimanager.desktop") == 0
+                
+                try:
+                    unchanged = plist_file.read_bytes() == plist_content
+                except FileNotFoundError:
+                    unchanged = False
                 
-                with open(plist_file, 'w') as f:
-                    f.write(plist_content)
+                # Nothing to do if the same agent is already installed and loaded
+                if unchanged and loaded:
+                    logger.info("macOS auto start already enabled")
+                    return True
+                
+                if loaded:
+                    await self._run_launchctl("unload", str(plist_file))
+                _write_file_bytes(plist_file, plist_content, 0o644)
                 
                 # Load the launch agent
-                subprocess.run(["launchctl", "load", str(plist_file)], check=True)
+                returncode = await self._run_launchctl("load", str(plist_file))
+                if returncode != 0:
+                    raise subprocess.CalledProcessError(returncode, ["launchctl", "load", str(plist_file)])
                 logger.info("macOS auto start enabled")
             else:
                 if plist_file.exists():
                     # Unload and remove the launch agent
-                    subprocess.run(["launchctl", "unload", str(plist_file)], check=False)
+                    await self._run_launchctl("unload", str(plist_file))
                     plist_file.unlink()
                     logger.info("macOS auto start disabled")
             
@@ -229,6 +431,16 @@ class DesktopIntegration:
             logger.error(f"Error setting up macOS auto start: {str(e)}")
             return False
     
+    @staticmethod
+    async def _run_launchctl(*args: str) -> int:
+        """Run launchctl without blocking the event loop, returning its exit code"""
+        proc = await asyncio.create_subprocess_exec(
+            "launchctl", *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        return await proc.wait()
+    
     async def _setup_linux_auto_start(self, enable: bool) -> bool:
         """Setup Linux auto start using .desktop file"""
         try:
@@ -238,22 +450,8 @@ class DesktopIntegration:
             desktop_file = autostart_dir / "ai-image-generator-manager.desktop"
             
             if enable:
-                desktop_content = f"""[Desktop Entry]
-Type=Application
-Name=AI Image Generator Manager
-Comment=Advanced desktop application for AI image generation
-Exec={sys.executable}
-Icon=ai-image-generator-manager
-Hidden=false
-NoDisplay=false
-X-GNOME-Autostart-enabled=true
-"""
-                
-                with open(desktop_file, 'w') as f:
-                    f.write(desktop_content)
-                
-                # Make executable
-                desktop_file.chmod(0o755)
+                # Written executable in one open/write/close
+                _write_file_bytes(desktop_file, _render_template(_LINUX_AUTOSTART_ENTRY), 0o755)
                 logger.info("Linux auto start enabled")
             else:
                 if desktop_file.exists():
@@ -268,12 +466,7 @@ X-GNOME-Autostart-enabled=true
     async def create_desktop_shortcut(self) -> bool:
         """Create desktop shortcut for the application"""
         try:
-            if self.platform == "windows":
-                return await self._create_windows_shortcut()
-            elif self.platform == "darwin":
-                return await self._create_macos_shortcut()
-            else:
-                return await self._create_linux_shortcut()
+            return await self._create_shortcut_impl()
         except Exception as e:
             logger.error(f"Error creating desktop shortcut: {str(e)}")
             return False
@@ -321,22 +514,8 @@ X-GNOME-Autostart-enabled=true
             desktop = Path.home() / "Desktop"
             desktop_file = desktop / "ai-image-generator-manager.desktop"
             
-            desktop_content = f"""[Desktop Entry]
-Version=1.0
-Type=Application
-Name=AI Image Generator Manager
-Comment=Advanced desktop application for AI image generation
-Exec={sys.executable}
-Icon=ai-image-generator-manager
-Terminal=false
-Categories=Graphics;Photography;
-"""
-            
-            with open(desktop_file, 'w') as f:
-                f.write(desktop_content)
-            
-            # Make executable
-            desktop_file.chmod(0o755)
+            # Written executable in one open/write/close
+            _write_file_bytes(desktop_file, _render_template(_LINUX_SHORTCUT_ENTRY), 0o755)
             logger.info("Linux desktop shortcut created")
             return True
         except Exception as e:
@@ -346,30 +525,52 @@ Categories=Graphics;Photography;
     async def get_app_logs(self, lines: int = 100) -> List[str]:
         """Get recent application logs"""
         try:
-            log_files = list(self.logs_dir.glob("*.log"))
-            if not log_files:
+            latest_log = self._get_latest_log()
+            if latest_log is None:
                 return []
             
-            # Get the most recent log file
-            latest_log = max(log_files, key=lambda f: f.stat().st_mtime)
-            
-            with open(latest_log, 'r') as f:
-                all_lines = f.readlines()
-                return all_lines[-lines:] if len(all_lines) > lines else all_lines
+            return _tail_lines(latest_log, lines)
         except Exception as e:
             logger.error(f"Error getting app logs: {str(e)}")
             return [f"Error reading logs: {str(e)}"]
     
+    def _scan_log_files(self) -> List[os.DirEntry]:
+        """List log files with os.scandir, whose DirEntry caches stat results"""
+        with os.scandir(self.logs_dir) as entries:
+            return [entry for entry in entries if entry.name.endswith(".log") and entry.is_file()]
+    
+    def _get_latest_log(self) -> Optional[Path]:
+        """Get the most recent log file, rescanning only when the logs directory changes"""
+        try:
+            dir_mtime = os.stat(self.logs_dir).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        
+        if self._log_cache is not None and self._log_cache[0] == dir_mtime:
+            return self._log_cache[1]
+        
+        log_files = self._scan_log_files()
+        latest_log = Path(max(log_files, key=lambda e: e.stat().st_mtime).path) if log_files else None
+        
+        self._log_cache = (dir_mtime, latest_log)
+        return latest_log
+    
     async def clear_cache(self) -> bool:
         """Clear application cache"""
         try:
-            import shutil
-            
-            if self.cache_dir.exists():
-                shutil.rmtree(self.cache_dir)
-                self.cache_dir.mkdir(parents=True, exist_ok=True)
-                logger.info("Application cache cleared")
+            # Swap the cache out with a single rename, then delete the old
+            # tree in a worker thread so the caller does not wait on the walk
+            tombstone = self.cache_dir.with_name(f".cache.del.{os.getpid()}.{time.time_ns()}")
+            try:
+                os.rename(self.cache_dir, tombstone)
+            except FileNotFoundError:
                 return True
+            
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            asyncio.get_running_loop().run_in_executor(
+                None, partial(shutil.rmtree, tombstone, ignore_errors=True)
+            )
+            logger.info("Application cache cleared")
             return True
         except Exception as e:
             logger.error(f"Error clearing cache: {str(e)}")
@@ -378,28 +579,42 @@ Categories=Graphics;Photography;
     async def export_data(self, export_path: str, include_logs: bool = False) -> bool:
         """Export application data for backup"""
         try:
-            import zipfile
-            
             export_file = Path(export_path)
             
-            with zipfile.ZipFile(export_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                # Add config file
-                if self.config_file.exists():
-                    zipf.write(self.config_file, "config.json")
-                
-                # Add logs if requested
-                if include_logs:
-                    for log_file in self.logs_dir.glob("*.log"):
-                        zipf.write(log_file, f"logs/{log_file.name}")
-                
-                # Add any other important files
-                # This would be expanded based on what data needs to be backed up
+            # Compression is CPU-bound; keep it off the event loop
+            await asyncio.to_thread(self._write_export, export_file, include_logs)
             
             logger.info(f"Data exported to {export_file}")
             return True
         except Exception as e:
             logger.error(f"Error exporting data: {str(e)}")
             return False
+    
+    def _write_export(self, export_file: Path, include_logs: bool):
+        """Write the backup archive"""
+        with zipfile.ZipFile(export_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            # Add config file, read once with its metadata from the open handle
+            try:
+                with open(self.config_file, 'rb') as f:
+                    config_stat = os.fstat(f.fileno())
+                    config_data = f.read()
+            except FileNotFoundError:
+                pass
+            else:
+                zipf.writestr(_zip_info("config.json", config_stat), config_data)
+            
+            # Add logs if requested, reusing the stat cached by scandir and
+            # streaming each file rather than letting ZipFile re-stat it
+            if include_logs and self.logs_dir.exists():
+                for log_file in self._scan_log_files():
+                    info = _zip_info(f"logs/{log_file.name}", log_file.stat())
+                    with open(log_file.path, 'rb') as src, zipf.open(info, 'w') as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+            
+            # Add any other important files
+            # This would be expanded based on what data needs to be backed up
 
-# Global instance
-desktop_integration = DesktopIntegration()
\ No newline at end of file
+# Shared instance, created on first use rather than at import
+@lru_cache(maxsize=1)
+def get_desktop_integration() -> DesktopIntegration:
+    return DesktopIntegration()
\ No newline at end of file
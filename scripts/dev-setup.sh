@@ -112,6 +112,7 @@ DB_NAME=ai_generator
 # API Keys (replace with your actual keys)
 OPENAI_API_KEY=your_openai_api_key_here
 GEMINI_API_KEY=your_gemini_api_key_here
+GEMINI_OR_API_KEY=your_openrouter_api_key_here
 
 # Server Configuration
 HOST=0.0.0.0
@@ -0,0 +1,81 @@
+import asyncio
+
+from advanced_features import AdvancedRateLimiter, BulkInsertWriter, ROLLING_WINDOW_SIZE
+
+
+def record(limiter, count, *args, **kwargs):
+    async def run():
+        for _ in range(count):
+            await limiter.record_request("provider", *args, **kwargs)
+    asyncio.run(run())
+
+
+def test_rate_limit_errors_cut_the_limit_once_per_window():
+    limiter = AdvancedRateLimiter()
+    record(limiter, ROLLING_WINDOW_SIZE, False, 5.0, "rate_limit")
+    assert limiter.adaptive_limits["provider"]["requests_per_minute"] == 5
+    
+    record(limiter, 1, False, 5.0, "rate_limit")
+    assert limiter.adaptive_limits["provider"]["requests_per_minute"] == 3
+
+
+def test_limit_increases_once_per_healthy_window():
+    limiter = AdvancedRateLimiter()
+    record(limiter, 10 * ROLLING_WINDOW_SIZE, True, 0.5)
+    
+    # One step per window of evidence, not one per request
+    assert limiter.adaptive_limits["provider"]["concurrency"] <= 10.0 + 10 * 0.5
+
+
+def test_failed_request_does_not_raise_the_limit():
+    limiter = AdvancedRateLimiter()
+    record(limiter, ROLLING_WINDOW_SIZE - 1, True, 0.1)
+    before = limiter.adaptive_limits["provider"]["concurrency"]
+    limiter._rolling["provider"]["since_increase"] = ROLLING_WINDOW_SIZE
+    
+    record(limiter, 1, False, 12.0, "server_error")
+    assert limiter.adaptive_limits["provider"]["concurrency"] == before
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+    
+    async def insert_many(self, documents, ordered=True):
+        await asyncio.sleep(0.01)  # Keep a batch in flight while close() runs
+        self.documents.extend(documents)
+
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+
+def test_bulk_insert_writer_close_flushes_in_flight_and_queued_documents():
+    async def run():
+        db = FakeDatabase()
+        writer = BulkInsertWriter(db, max_batch=10, max_delay=0.01)
+        for i in range(25):
+            writer.enqueue("events", {"i": i})
+        await asyncio.sleep(0.015)  # First batch taken off the queue and mid-write
+        await writer.close()
+        return db
+    
+    db = asyncio.run(run())
+    assert sorted(doc["i"] for doc in db["events"].documents) == list(range(25))
+
+
+def test_bulk_insert_writer_restarts_after_close():
+    async def run():
+        db = FakeDatabase()
+        writer = BulkInsertWriter(db)
+        writer.enqueue("events", {"i": 0})
+        await writer.close()
+        writer.enqueue("events", {"i": 1})
+        await writer.close()
+        await writer.close()  # Closing an idle writer is a no-op
+        return db
+    
+    db = asyncio.run(run())
+    assert [doc["i"] for doc in db["events"].documents] == [0, 1]
@@ -0,0 +1,38 @@
+import asyncio
+
+from batch_writer import BatchWriter
+
+
+def test_batches_preserve_order_and_respect_max_batch():
+    batches = []
+    
+    async def flush(batch):
+        batches.append(list(batch))
+    
+    async def run():
+        writer = BatchWriter(flush, max_batch=3, max_delay=0.05)
+        for i in range(7):
+            writer.enqueue(i)
+        await writer.close()
+    
+    asyncio.run(run())
+    assert [item for batch in batches for item in batch] == list(range(7))
+    assert all(len(batch) <= 3 for batch in batches)
+
+
+def test_failed_flush_does_not_stop_the_drain_loop():
+    written = []
+    
+    async def flush(batch):
+        if batch[0] == "bad":
+            raise RuntimeError("write failed")
+        written.extend(batch)
+    
+    async def run():
+        writer = BatchWriter(flush, max_batch=1)
+        writer.enqueue("bad")
+        writer.enqueue("good")
+        await writer.close()
+    
+    asyncio.run(run())
+    assert written == ["good"]
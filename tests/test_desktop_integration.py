@@ -0,0 +1,41 @@
+import random
+
+from desktop_integration import _tail_lines
+
+
+def reference_tail(data: bytes, lines: int):
+    text = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n").decode()
+    return text.splitlines(keepends=True)[-lines:] if lines > 0 else []
+
+
+def test_tail_lines_normalizes_line_endings(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_bytes(b"one\r\ntwo\rthree\nfour\r\n")
+    
+    assert _tail_lines(path, 3) == ["two\n", "three\n", "four\n"]
+
+
+def test_tail_lines_handles_crlf_split_across_blocks(tmp_path):
+    path = tmp_path / "app.log"
+    # With 4 byte blocks read from the end, the \r\n after "bb" straddles a
+    # block boundary and must count as one line break
+    path.write_bytes(b"a\r\nbb\r\nccc\r\n")
+    
+    assert _tail_lines(path, 2, block_size=4) == ["bb\n", "ccc\n"]
+
+
+def test_tail_lines_matches_reference_on_random_files(tmp_path):
+    rng = random.Random(0)
+    path = tmp_path / "app.log"
+    for _ in range(500):
+        data = b"".join(
+            b"x" * rng.randint(0, 7) + rng.choice((b"\n", b"\r\n", b"\r"))
+            for _ in range(rng.randint(0, 30))
+        )
+        if rng.random() < 0.3:
+            data += b"partial"
+        path.write_bytes(data)
+        lines = rng.randint(0, 35)
+        block_size = rng.randint(1, 9)
+        
+        assert _tail_lines(path, lines, block_size) == reference_tail(data, lines)
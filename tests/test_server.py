@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def local_limiter(monkeypatch):
+    monkeypatch.setattr(server, "redis_client", None)
+    monkeypatch.setattr(server, "rate_limiters", {})
+    clock = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: clock[0])
+    return clock
+
+
+def check(provider, limit):
+    return asyncio.run(server.check_rate_limit(provider, limit))
+
+
+def test_token_bucket_allows_up_to_limit_then_denies(local_limiter):
+    assert [check("openai", 3)[0] for _ in range(3)] == [True, True, True]
+    allowed, retry_after = check("openai", 3)
+    assert not allowed
+    assert retry_after == pytest.approx(20.0)
+
+
+def test_denied_callers_reserve_distinct_slots(local_limiter):
+    for _ in range(6):
+        check("openai", 6)
+    waits = [check("openai", 6)[1] for _ in range(3)]
+    # One token refills every 10s; each denied caller holds the next one
+    assert waits == pytest.approx([10.0, 20.0, 30.0])
+
+
+def test_token_bucket_refills_over_time(local_limiter):
+    for _ in range(2):
+        check("gemini", 2)
+    assert not check("gemini", 2)[0]
+    # The denied caller's reserved token refills first
+    local_limiter[0] += 30
+    assert not check("gemini", 2)[0]
+    local_limiter[0] += 60
+    assert check("gemini", 2) == (True, 0.0)
+
+
+def test_providers_are_limited_independently(local_limiter):
+    check("openai", 1)
+    assert not check("openai", 1)[0]
+    assert check("gemini", 1)[0]
+
+
+@pytest.fixture
+def auth_client():
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route, WebSocketRoute
+    from starlette.testclient import TestClient
+    
+    async def echo(websocket):
+        await websocket.accept()
+        await websocket.send_text("hello")
+        await websocket.close()
+    
+    app = Starlette(routes=[
+        Route("/", lambda request: PlainTextResponse("ok")),
+        WebSocketRoute("/ws", echo),
+    ])
+    return TestClient(server.BearerAuthMiddleware(app, token="s3cret"))
+
+
+@pytest.mark.parametrize("header, status", [
+    ("Bearer s3cret", 200),
+    ("bearer s3cret", 200),
+    ("Bearer wrong", 401),
+    ("Basic s3cret", 401),
+    (None, 401),
+])
+def test_http_requests_need_the_bearer_token(auth_client, header, status):
+    headers = {"Authorization": header} if header else {}
+    assert auth_client.get("/", headers=headers).status_code == status
+
+
+@pytest.mark.parametrize("url", ["/ws", "/ws?token=wrong"])
+def test_websockets_without_the_token_are_closed(auth_client, url):
+    from starlette.websockets import WebSocketDisconnect
+    
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with auth_client.websocket_connect(url) as websocket:
+            websocket.receive_text()
+    assert closed.value.code == 1008
+
+
+def test_websockets_with_the_token_connect(auth_client):
+    with auth_client.websocket_connect("/ws?token=s3cret") as websocket:
+        assert websocket.receive_text() == "hello"